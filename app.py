@@ -1,28 +1,47 @@
 import zipfile
+import io
+import csv
+import codecs
+import mmap
+import threading
 import os
 import tempfile
-import aiofiles
 import asyncio
+import contextlib
 from werkzeug.utils import secure_filename
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from fastapi import FastAPI, UploadFile, Form, HTTPException
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import subprocess
 import hashlib
 import shutil
-import requests
+import httpx
+import orjson
+from cachetools import TTLCache
 import uvicorn
+import anyio.to_thread
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
 
 # Load environment variables
 load_dotenv()
 
-# Initialize FastAPI app
-app = FastAPI()
-
 # Configuration
 ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls', 'zip', 'md'}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+MAX_ZIP_ENTRIES = 1000  # entries per upload, including nested archives
+MAX_ZIP_EXPANDED_SIZE = 4 * MAX_FILE_SIZE  # 200MB total decompressed per upload, including nested archives
+MAX_ZIP_DEPTH = 3  # levels of archives nested inside an uploaded ZIP
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+CSV_BLOCK_SIZE = 1024 * 1024  # 1MB blocks for the pyarrow CSV reader
+SNIFF_SIZE = 4 * 1024  # leading bytes inspected to identify files with unknown extensions
+ZIP_MAGIC = b'PK\x03\x04'
+OLE2_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+THREADPOOL_SIZE = 64  # worker threads for blocking file parsing and I/O
 LLM_FOUNDRY_TOKEN = os.getenv('LLM_FOUNDRY_TOKEN')
 
 """ Path: /gemini/v1beta/models/gemini-2.0-flash-001:generateContent
@@ -33,12 +52,129 @@ models/gemini-2.0-flash-001: This specifies the particular model you are accessi
  """
 LLM_ENDPOINT = "https://llmfoundry.straive.com/gemini/v1beta/models/gemini-2.0-flash-001:generateContent"
 
+# Static parts of the LLM request, built once at import time
+SYSTEM_PROMPT = (
+    "You are an expert Data Science teaching assistant for an online Degree in Data Science program. "
+    "Your task is to provide precise answers to graded assignment questions, ensuring they match exactly what is expected.\n\n"
+    "Key guidelines:\n"
+    "1. Provide exact answers without additional text or explanations.\n"
+    "2. For numerical answers, give the exact number.\n"
+    "3. For file-based questions, analyze the provided file information and perform necessary calculations or commands, providing the result.\n"
+    "4. For command outputs, provide the exact output as it would appear, not a description or example. If execution is not possible, give a realistic lookalike output.\n"
+    "5. For Google Sheets formulas, calculate the result and provide the numerical answer.\n"
+    "6. For multi-step questions, break down the steps and provide the final answer."
+)
+SYSTEM_INSTRUCTION = {"parts": [{"text": SYSTEM_PROMPT}]}
+GENERATION_CONFIG = {"temperature": 0}
+LLM_TOOLS = [{"google_search": {}}]
+LLM_HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {LLM_FOUNDRY_TOKEN}:project-2"
+}
+
+PRETTIER_PACKAGE = "prettier@3.4.2"
+PRETTIER_PREFIX = os.getenv('PRETTIER_PREFIX', '/opt/prettier')  # persistent install location for prettier
+PRETTIER_BIN = os.path.join(PRETTIER_PREFIX, 'node_modules', '.bin', 'prettier')
+PRETTIER_INSTALL_TIMEOUT = 120  # seconds
+
+LLM_TIMEOUT = 60  # seconds
+LLM_CACHE_SIZE = 1024  # maximum number of cached answers
+LLM_CACHE_TTL = 60 * 60  # 1 hour
+LLM_KEEPALIVE_EXPIRY = 60  # seconds an idle pooled connection is kept open
+
+# Shared async HTTP client for LLM calls, created in lifespan so the TCP+TLS session is reused across requests
+CLIENT: httpx.AsyncClient = None
+
+# Background prettier install started in lifespan; kept referenced so it isn't garbage-collected
+PRETTIER_INSTALL_TASK: asyncio.Task = None
+
+# Cache of LLM answers keyed by (question, file type, file SHA256) so repeated questions skip the remote call
+LLM_CACHE: TTLCache = TTLCache(maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
+
+async def _install_prettier():
+    """Install prettier into a private temp prefix, then atomically rename it into PRETTIER_PREFIX.
+
+    Only a complete install ever appears at PRETTIER_PREFIX, so concurrent workers can't corrupt it
+    or run a half-linked binary; if another worker's rename wins, ours is discarded.
+    """
+    if os.path.exists(PRETTIER_BIN):
+        return
+    parent_dir = os.path.dirname(PRETTIER_PREFIX)
+    try:
+        os.makedirs(parent_dir, exist_ok=True)
+        temp_prefix = tempfile.mkdtemp(prefix='.prettier-', dir=parent_dir)  # Same filesystem, so the rename is atomic
+    except OSError:
+        return  # Install location not writable; prettier_sha256 falls back to npx
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "npm", "install", "--prefix", temp_prefix, PRETTIER_PACKAGE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            await asyncio.wait_for(process.wait(), timeout=PRETTIER_INSTALL_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # Don't leave npm writing into the temp prefix after a timeout or shutdown
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        if process.returncode == 0 and os.path.exists(os.path.join(temp_prefix, 'node_modules', '.bin', 'prettier')):
+            os.rename(temp_prefix, PRETTIER_PREFIX)
+    except asyncio.TimeoutError:
+        pass  # npm hung (e.g. no network); prettier_sha256 falls back to npx
+    except OSError:
+        pass  # npm unavailable or another worker installed first; prettier_sha256 falls back to npx
+    finally:
+        await asyncio.to_thread(shutil.rmtree, temp_prefix, ignore_errors=True)
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up and tear down the app's shared resources: thread pools, the prettier install and the LLM client."""
+    global CLIENT, PRETTIER_INSTALL_TASK
+
+    # Enlarge the worker thread pools so overlapping uploads can parse files in parallel:
+    # the default executor is used by asyncio.to_thread, the anyio limiter by Starlette's UploadFile I/O
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=THREADPOOL_SIZE))
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+    # Pre-install prettier in the background so requests can run it without an npx resolve per call
+    PRETTIER_INSTALL_TASK = asyncio.create_task(_install_prettier())
+
+    # Pooled HTTP/2 client used for LLM calls
+    CLIENT = httpx.AsyncClient(
+        http2=True,
+        timeout=LLM_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=LLM_KEEPALIVE_EXPIRY)
+    )
+
+    try:
+        yield
+    finally:
+        await CLIENT.aclose()
+        # Stop a prettier install that is still running, waiting for it to kill npm and clean up
+        PRETTIER_INSTALL_TASK.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await PRETTIER_INSTALL_TASK
+
+# Initialize FastAPI app
+app = FastAPI(lifespan=lifespan)
+
+def _sync_read_text(path: str) -> str:
+    """Read a text file in a single blocking call (run via asyncio.to_thread)."""
+    with open(path, 'r') as f:
+        return f.read()
+
 def is_file_allowed(filename: str) -> bool:
     """Check if the file extension is allowed."""
-    return any(filename.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS)
+    return os.path.splitext(filename)[1].lower().lstrip('.') in ALLOWED_EXTENSIONS
 
-async def identify_file_type(file_path: str) -> str:
-    """Determine file type based on extension and content."""
+def _detect_file_type(file_path: str, file_source: Union[str, io.BytesIO] = None) -> str:
+    """Determine file type based on extension and content.
+
+    file_source optionally supplies the content (e.g. an in-memory ZIP member) when it is not on disk at file_path.
+    """
+    source = file_path if file_source is None else file_source
     extension = os.path.splitext(file_path)[1].lower()
     
     # Mapping of extensions to file types
@@ -54,23 +190,52 @@ async def identify_file_type(file_path: str) -> str:
     if extension in extension_map:
         return extension_map[extension]
     
-    # Try to read the file content if the extension is unknown
+    # Sniff the content if the extension is unknown
     try:
-        # Attempt to read as CSV first
-        pd.read_csv(file_path, nrows=1)
-        return 'csv'
-    except pd.errors.EmptyDataError:
-        # Handle empty CSV files gracefully
-        pass
-    except Exception:
-        # If reading as CSV fails, try reading as Excel
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                header = f.read(SNIFF_SIZE)
+        else:
+            header = source.read(SNIFF_SIZE)
+    except OSError:
+        return 'unknown'
+    finally:
+        # Rewind in-memory content so it can be processed after probing
+        if not isinstance(source, str):
+            source.seek(0)
+
+    # Match magic numbers first
+    if header.startswith(OLE2_MAGIC):
+        return 'excel'  # Legacy .xls workbook
+    if header.startswith(ZIP_MAGIC):
         try:
-            pd.read_excel(file_path, nrows=1)
-            return 'excel'
-        except Exception:
-            pass
-    
-    return 'unknown'
+            with zipfile.ZipFile(source) as zip_ref:
+                # XLSX workbooks are ZIP containers with an Office content-types manifest
+                return 'excel' if '[Content_Types].xml' in zip_ref.namelist() else 'zip'
+        except zipfile.BadZipFile:
+            return 'unknown'
+        finally:
+            if not isinstance(source, str):
+                source.seek(0)
+
+    # Fall back to a CSV heuristic on the leading text
+    try:
+        sample = codecs.getincrementaldecoder('utf-8')().decode(header)
+    except UnicodeDecodeError:
+        return 'unknown'
+    if '\x00' in sample:
+        return 'unknown'  # NUL bytes mean binary content, whatever the Sniffer would make of it
+    try:
+        csv.Sniffer().sniff(sample)
+        return 'csv'
+    except csv.Error:
+        # Single-column data has no delimiter to sniff; accept plain text with a header and at least one row
+        lines = [line for line in sample.splitlines() if line.strip()]
+        return 'csv' if len(lines) >= 2 else 'unknown'
+
+async def identify_file_type(file_path: str) -> str:
+    """Determine file type based on extension and content."""
+    return await asyncio.to_thread(_detect_file_type, file_path)
 
 async def collect_file_data(file_path: str) -> str:
     """Extract information from different file types."""
@@ -92,53 +257,189 @@ async def collect_file_data(file_path: str) -> str:
     else:
         return "Unsupported file type"
 
-async def handle_zip_file(zip_path: str) -> str:
+class _ZipBudget:
+    """Entry and decompressed-byte allowance shared by an uploaded ZIP and every archive nested inside it."""
+
+    def __init__(self):
+        self.entries_left = MAX_ZIP_ENTRIES
+        self.bytes_left = MAX_ZIP_EXPANDED_SIZE
+        self._lock = threading.Lock()  # Nested archives are read from concurrent worker threads
+
+    def charge(self, num_entries: int, num_bytes: int) -> None:
+        """Reserve entries and bytes, raising ValueError if the upload would exceed its limits."""
+        with self._lock:
+            if num_entries > self.entries_left:
+                raise ValueError(f"archive has more than {MAX_ZIP_ENTRIES} entries in total")
+            if num_bytes > self.bytes_left:
+                raise ValueError("archive expands beyond the allowed size")
+            self.entries_left -= num_entries
+            self.bytes_left -= num_bytes
+
+def _read_zip_members(zip_source: Union[str, io.BytesIO], budget: _ZipBudget) -> list[tuple[str, bytes]]:
+    """Read every non-directory member of a ZIP archive into memory as (name, content) pairs.
+
+    The members are charged against budget, so nested archives share the limits of the upload.
+    Raises ValueError if the archive exceeds the entry-count or decompressed-size limits.
+    """
+    with zipfile.ZipFile(zip_source, 'r') as zip_ref:
+        infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+        for info in infos:
+            if info.file_size > MAX_FILE_SIZE:
+                raise ValueError(f"'{info.filename}' expands beyond the allowed size")
+
+        # Reject on the declared sizes before decompressing anything
+        budget.charge(len(infos), sum(info.file_size for info in infos))
+
+        members = []
+        for info in infos:
+            # Read at most one byte past the declared size so a forged header can't expand further
+            with zip_ref.open(info) as f:
+                data = f.read(info.file_size + 1)
+            if len(data) > info.file_size:
+                raise ValueError(f"'{info.filename}' expands beyond its declared size")
+            members.append((info.filename, data))
+        return members
+
+def _format_zip_info(names: list[str], member_infos: list[str]) -> str:
+    """Join per-member summaries into the ZIP description."""
+    return "\n".join(f"File '{name}' in ZIP contains:\n{member_info}" for name, member_info in zip(names, member_infos))
+
+def _summarize_zip(zip_source: Union[str, io.BytesIO], budget: _ZipBudget, depth: int) -> str:
+    """Summarize a ZIP archive synchronously (used for archives nested inside a ZIP)."""
+    if depth > MAX_ZIP_DEPTH:
+        return f"Error processing ZIP file: archives nested more than {MAX_ZIP_DEPTH} levels deep are not processed"
+    try:
+        members = _read_zip_members(zip_source, budget)
+    except Exception as e:
+        return f"Error processing ZIP file: {str(e)}"
+    return _format_zip_info(
+        [name for name, _ in members],
+        [_process_member(name, data, budget, depth) for name, data in members]
+    )
+
+def _process_member(name: str, data: bytes, budget: _ZipBudget, depth: int = 0) -> str:
+    """Summarize a single in-memory ZIP member, dispatching on its detected type.
+
+    depth is the nesting level of the archive containing the member (0 for the uploaded ZIP).
+    """
+    source = io.BytesIO(data)
+    file_type = _detect_file_type(name, source)
+
+    # Nested archives draw on the same budget as the upload
+    if file_type == 'zip':
+        return _summarize_zip(source, budget, depth + 1)
+
+    # Mapping of file types to their synchronous processing functions
+    processing_functions = {
+        'csv': _summarize_csv,
+        'excel': _summarize_excel,
+        'md': _summarize_markdown
+    }
+
+    process_function = processing_functions.get(file_type)
+
+    if process_function:
+        return process_function(source)
+    else:
+        return "Unsupported file type"
+
+async def handle_zip_file(zip_source: Union[str, io.BytesIO]) -> str:
     """Process ZIP file and return information about its contents."""
-    info = []
-    
+    budget = _ZipBudget()
     try:
-        async with aiofiles.open(zip_path, 'rb') as zip_file:
-            with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                # Iterate through the files in the ZIP archive
-                for file in zip_ref.namelist():
-                    if file.endswith('/'):
-                        continue  # Skip directories
-                    
-                    # Read the file content directly into memory
-                    with zip_ref.open(file) as f:
-                        file_content = await f.read()
-                        
-                        # Create a temporary file path
-                        temp_path = os.path.join(tempfile.gettempdir(), secure_filename(file))
-                        
-                        # Write the content to a temporary file asynchronously
-                        async with aiofiles.open(temp_path, 'wb') as temp_file:
-                            await temp_file.write(file_content)
-                        
-                        # Collect data from the temporary file
-                        file_info = await collect_file_data(temp_path)
-                        info.append(f"File '{file}' in ZIP contains:\n{file_info}")
-                        
-                        # Clean up the temporary file
-                        os.remove(temp_path)
+        # Read the members directly into memory, then process them concurrently in worker threads
+        members = await asyncio.to_thread(_read_zip_members, zip_source, budget)
+        member_infos = await asyncio.gather(
+            *[asyncio.to_thread(_process_member, name, data, budget) for name, data in members]
+        )
     except Exception as e:
         return f"Error processing ZIP file: {str(e)}"
     
-    return "\n".join(info)
+    return _format_zip_info([name for name, _ in members], member_infos)
 
-async def handle_csv_file(csv_path: str, num_preview_rows: int = 5) -> str:
-    """Process CSV file and return summary information."""
+def _count_csv_rows(csv_path: Union[str, io.BytesIO]) -> int:
+    """Count the data rows of a CSV by streaming it through csv.reader.
+
+    Quoted fields spanning several lines count as one record, any line ending (LF, CRLF or CR) is
+    accepted, and blank lines are skipped as pandas does; fields are never materialized into a DataFrame.
+    """
+    if isinstance(csv_path, str):
+        text = open(csv_path, 'r', encoding='utf-8', errors='replace', newline='')
+    else:
+        csv_path.seek(0)
+        text = io.TextIOWrapper(csv_path, encoding='utf-8', errors='replace', newline='')
+    try:
+        num_records = sum(1 for row in csv.reader(text) if row)
+    finally:
+        if isinstance(csv_path, str):
+            text.close()
+        else:
+            text.detach()  # Leave the caller's buffer open
+    return max(num_records - 1, 0)  # Exclude the header record
+
+def _read_csv_preview_arrow(csv_path: Union[str, io.BytesIO], num_preview_rows: int) -> pa.Table:
+    """Parse just enough leading blocks of a CSV with pyarrow's multi-threaded C reader to build the preview."""
+    read_options = pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE, use_threads=True)
+    # Memory-map files on disk so pyarrow reads straight from the page cache
+    source = pa.memory_map(csv_path, 'r') if isinstance(csv_path, str) else csv_path
+    try:
+        reader = pa_csv.open_csv(source, read_options=read_options)
+    except Exception:
+        if isinstance(csv_path, str):
+            source.close()
+        raise
     try:
-        df = pd.read_csv(csv_path)
+        batches = []
+        num_read = 0
+        while num_read < num_preview_rows:
+            try:
+                batch = reader.read_next_batch()
+            except StopIteration:
+                break
+            batches.append(batch)
+            num_read += batch.num_rows
+        return pa.Table.from_batches(batches, schema=reader.schema).slice(0, num_preview_rows)
+    finally:
+        reader.close()
+        if isinstance(csv_path, str):
+            source.close()
+
+def _read_csv_preview(csv_path: Union[str, io.BytesIO], num_preview_rows: int) -> pd.DataFrame:
+    """Read the preview rows of a CSV, preferring pyarrow and falling back to pandas where they disagree.
+
+    pyarrow rejects ragged rows, keeps duplicate header names and returns undecodable text as binary,
+    all of which pandas handles (or reports) its own way, so those inputs are re-read with pandas.
+    """
+    try:
+        table = _read_csv_preview_arrow(csv_path, num_preview_rows)
+    except pa.ArrowInvalid:
+        table = None
+
+    if table is not None:
+        has_duplicate_names = len(set(table.column_names)) != len(table.column_names)
+        has_binary_columns = any(pa.types.is_binary(t) or pa.types.is_large_binary(t) for t in table.schema.types)
+        if not has_duplicate_names and not has_binary_columns:
+            return table.to_pandas()
+
+    if not isinstance(csv_path, str):
+        csv_path.seek(0)
+    return pd.read_csv(csv_path, nrows=num_preview_rows)
+
+def _summarize_csv(csv_path: Union[str, io.BytesIO], num_preview_rows: int = 5) -> str:
+    """Summarize a CSV file or buffer."""
+    try:
+        # Only parse the rows needed for the preview; the row count comes from a separate csv.reader pass
+        df = _read_csv_preview(csv_path, num_preview_rows)
         
         # Store the number of rows and columns
-        num_rows, num_columns = df.shape
+        num_rows = _count_csv_rows(csv_path)
+        num_columns = len(df.columns)
         
         # Create a summary string
         summary = (
             f"CSV file with {num_rows} rows and {num_columns} columns.\n"
             f"Columns: {', '.join(df.columns)}.\n"
-            f"First {num_preview_rows} rows:\n{df.head(num_preview_rows).to_string(index=False)}"
+            f"First {num_preview_rows} rows:\n{df.to_string(index=False)}"
         )
         return summary
     except FileNotFoundError:
@@ -150,8 +451,12 @@ async def handle_csv_file(csv_path: str, num_preview_rows: int = 5) -> str:
     except Exception as e:
         return f"Error processing CSV: {str(e)}"
 
-async def handle_excel_file(excel_path: str) -> str:
-    """Process Excel file and return summary information."""
+async def handle_csv_file(csv_path: Union[str, io.BytesIO], num_preview_rows: int = 5) -> str:
+    """Process CSV file and return summary information."""
+    return await asyncio.to_thread(_summarize_csv, csv_path, num_preview_rows)
+
+def _summarize_excel(excel_path: Union[str, io.BytesIO]) -> str:
+    """Summarize every sheet of an Excel file or buffer."""
     try:
         # Read all sheets into a dictionary of DataFrames
         sheets_dict = pd.read_excel(excel_path, sheet_name=None)
@@ -172,11 +477,17 @@ async def handle_excel_file(excel_path: str) -> str:
     except Exception as e:
         return f"Error processing Excel file: {str(e)}"
 
-async def handleMarkdownFile(md_path: str) -> str:
-    """Process Markdown file and return its content."""
+async def handle_excel_file(excel_path: Union[str, io.BytesIO]) -> str:
+    """Process Excel file and return summary information."""
+    return await asyncio.to_thread(_summarize_excel, excel_path)
+
+def _summarize_markdown(md_path: Union[str, io.BytesIO]) -> str:
+    """Return the content of a Markdown file or buffer."""
     try:
-        async with aiofiles.open(md_path, 'r') as f:
-            content = await f.read()
+        if isinstance(md_path, str):
+            content = _sync_read_text(md_path)
+        else:
+            content = md_path.read().decode()
         return f"Markdown file content:\n{content}"
     except FileNotFoundError:
         return "Error: The specified Markdown file was not found."
@@ -185,6 +496,10 @@ async def handleMarkdownFile(md_path: str) -> str:
     except Exception as e:
         return f"An unexpected error occurred: {str(e)}"
 
+async def handleMarkdownFile(md_path: Union[str, io.BytesIO]) -> str:
+    """Process Markdown file and return its content."""
+    return await asyncio.to_thread(_summarize_markdown, md_path)
+
 async def run_command(command: str, cwd: str = None) -> str:
     """Execute a shell command asynchronously and return its output."""
     try:
@@ -207,35 +522,70 @@ async def run_command(command: str, cwd: str = None) -> str:
     except Exception as e:
         return f"Error executing command: {str(e)}"
 
-async def compute_sha256(file_path: str) -> str:
-    """Calculate the SHA256 hash of a file in an optimized way by reading it in chunks."""
+def _sha256_sync(file_path: str) -> str:
+    """Hash a file through a read-only memory map, feeding hashlib 1 MB slices so it can release the GIL."""
     sha256_hash = hashlib.sha256()  # Create a new SHA256 hash object
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return sha256_hash.hexdigest()  # Empty files cannot be memory-mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(view), HASH_CHUNK_SIZE):
+                    sha256_hash.update(view[offset:offset + HASH_CHUNK_SIZE])  # Update the hash without copying
+            finally:
+                view.release()  # Release the buffer before the map is closed
+    return sha256_hash.hexdigest()  # Return the hexadecimal digest of the hash
+
+def _is_sha256_digest(value: str) -> bool:
+    """Check that a value is a SHA256 hex digest rather than an error message."""
+    return len(value) == 64 and all(c in '0123456789abcdef' for c in value)
+
+async def compute_sha256(file_path: str) -> str:
+    """Calculate the SHA256 hash of a file in a worker thread so the event loop is not blocked."""
     try:
-        async with aiofiles.open(file_path, "rb") as f:
-            while True:
-                chunk = await f.read(8192)  # Read the file in 8 KB chunks
-                if not chunk:  # If the chunk is empty, we reached the end of the file
-                    break
-                sha256_hash.update(chunk)  # Update the hash with the chunk
-        return sha256_hash.hexdigest()  # Return the hexadecimal digest of the hash
+        return await asyncio.to_thread(_sha256_sync, file_path)
     except Exception as e:
         return f"Error calculating SHA256: {str(e)}"
 
-async def generate_response(question: str, file_info: str = None) -> str:
-    """Generate response using Gemini 2.0 Flash model."""
+async def prettier_sha256(file_path: str, cwd: str = None) -> str:
+    """Format a file with prettier and hash its output in-process, matching `prettier <file> | sha256sum`."""
+    sha256_hash = hashlib.sha256()
+
+    async def hash_stdout(stream: asyncio.StreamReader) -> None:
+        while chunk := await stream.read(HASH_CHUNK_SIZE):
+            sha256_hash.update(chunk)
+
+    try:
+        # Spawn prettier directly (no shell) and hash its stdout as it streams in
+        if os.path.exists(PRETTIER_BIN):
+            command = (PRETTIER_BIN, file_path)
+        else:
+            command = ("npx", "-y", PRETTIER_PACKAGE, file_path)
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        # Drain stderr concurrently so a chatty process can't block on a full pipe
+        _, stderr = await asyncio.gather(hash_stdout(process.stdout), process.stderr.read())
+        await process.wait()
+
+        if process.returncode != 0:
+            return f"Error: Command failed with exit code {process.returncode}. Output: {stderr.decode().strip()}"
+
+        return f"{sha256_hash.hexdigest()}  -"
+
+    except Exception as e:
+        return f"Error executing command: {str(e)}"
+
+async def generate_response(client: httpx.AsyncClient, question: str, file_info: str = None, cache_key: tuple = None) -> str:
+    """Generate response using Gemini 2.0 Flash model, reusing cached answers when a cache_key is given."""
+    if cache_key is not None and cache_key in LLM_CACHE:
+        return LLM_CACHE[cache_key]
     
-    # Define the system prompt once
-    system_prompt = (
-        "You are an expert Data Science teaching assistant for an online Degree in Data Science program. "
-        "Your task is to provide precise answers to graded assignment questions, ensuring they match exactly what is expected.\n\n"
-        "Key guidelines:\n"
-        "1. Provide exact answers without additional text or explanations.\n"
-        "2. For numerical answers, give the exact number.\n"
-        "3. For file-based questions, analyze the provided file information and perform necessary calculations or commands, providing the result.\n"
-        "4. For command outputs, provide the exact output as it would appear, not a description or example. If execution is not possible, give a realistic lookalike output.\n"
-        "5. For Google Sheets formulas, calculate the result and provide the numerical answer.\n"
-        "6. For multi-step questions, break down the steps and provide the final answer."
-    )
     # Construct the message prompt based on the presence of file_info
     attached_file_info = f'Attached file information:\n{file_info}\n' if file_info else ''
     message_prompt = (
@@ -246,33 +596,32 @@ async def generate_response(question: str, file_info: str = None) -> str:
     
     # Prepare the request payload
     payload = {
-        "system_instruction": {"parts": [{"text": system_prompt}]},
+        "system_instruction": SYSTEM_INSTRUCTION,
         "contents": [{"role": "user", "parts": [{"text": message_prompt}]}],
-        "generationConfig": {"temperature": 0},
-        "tools": [{"google_search": {}}]
+        "generationConfig": GENERATION_CONFIG,
+        "tools": LLM_TOOLS
     }
     
     try:
         # Make the API request
-        response = requests.post(
+        response = await client.post(
             LLM_ENDPOINT,
-            headers={
-                "Content-Type": "application/json", 
-                "Authorization": f"Bearer {LLM_FOUNDRY_TOKEN}:project-2"
-            },
-            json=payload,
-            timeout=60
+            headers=LLM_HEADERS,
+            content=orjson.dumps(payload)
         )
         response.raise_for_status()
         
         # Extract the answer from the response
-        candidates = response.json().get('candidates', [])
+        candidates = orjson.loads(response.content).get('candidates', [])
         if candidates:
-            return candidates[0]['content']['parts'][0]['text'].strip()
+            answer = candidates[0]['content']['parts'][0]['text'].strip()
+            if cache_key is not None:
+                LLM_CACHE[cache_key] = answer
+            return answer
         
         return "Error: Could not extract answer from model response"
     
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, orjson.JSONDecodeError) as e:
         return f"Error calling LLM API: {str(e)}"
 
 @app.post("/api/")
@@ -280,50 +629,70 @@ async def answer_question(question: str = Form(...), file: UploadFile = None):
     """API endpoint to answer questions with optional file attachments."""
     answer = None
     file_info = None
+    # Questions without a file are cached on the question alone
+    cache_key = (question.strip(), None, None)
 
     if file:
-        if not await is_file_allowed(file.filename):
+        if not is_file_allowed(file.filename):
             raise HTTPException(status_code=400, detail="Invalid file type")
 
-        # Create a temporary directory and file path
-        temp_dir = tempfile.mkdtemp()
-        file_path = os.path.join(temp_dir, secure_filename(file.filename))
+        # Create a temporary directory; it is removed with everything in it once the request is done
+        temp_dir_handle = tempfile.TemporaryDirectory()
+        temp_dir = temp_dir_handle.name
 
         try:
-            # Save the file temporarily
-            async with aiofiles.open(file_path, 'wb') as out_file:
-                content = await file.read()
-                await out_file.write(content)
-
-            # Check file size
-            if os.path.getsize(file_path) > MAX_FILE_SIZE:
-                raise HTTPException(status_code=400, detail="File too large")
+            file_path = os.path.join(temp_dir, secure_filename(file.filename))
+
+            # Stream the upload to disk in chunks, rejecting it as soon as it exceeds the size limit
+            out_file = await asyncio.to_thread(open, file_path, 'wb')
+            try:
+                total_size = 0
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    total_size += len(chunk)
+                    if total_size > MAX_FILE_SIZE:
+                        raise HTTPException(status_code=400, detail="File too large")
+                    await asyncio.to_thread(out_file.write, chunk)
+            finally:
+                await asyncio.to_thread(out_file.close)
 
             # Process the file
             file_type = await identify_file_type(file_path)
             file_info = await collect_file_data(file_path)
-
-            # Handle specific questions that require local execution
-            if "sha256sum" in question.lower() and file_type == 'md':
-                answer = await compute_sha256(file_path)
-            elif "prettier" in question.lower() and "sha256sum" in question.lower() and file_type == 'md':
-                prettier_command = f"npx -y prettier@3.4.2 {file_path} | sha256sum"
-                answer = await run_command(prettier_command, cwd=temp_dir)
-            elif "code -s" in question.lower():
+            file_sha256 = await compute_sha256(file_path)
+
+            # Key the cache on the file's type and content; skip caching if the file could not be hashed
+            cache_key = (question.strip(), file_type, file_sha256) if _is_sha256_digest(file_sha256) else None
+
+            # Handle specific questions that require local execution (lowercase and scan the question once)
+            question_lower = question.lower()
+            has_sha256sum = "sha256sum" in question_lower
+            has_prettier = "prettier" in question_lower
+            has_code_s = "code -s" in question_lower
+
+            if has_prettier and has_sha256sum and file_type == 'md':
+                answer = await prettier_sha256(file_path, cwd=temp_dir)
+            elif has_sha256sum and file_type == 'md':
+                answer = file_sha256
+            elif has_code_s:
                 answer = await run_command("code -s")
 
         finally:
-            # Clean up
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
+            # Clean up off the event loop (TemporaryDirectory.cleanup uses shutil.rmtree)
+            await asyncio.to_thread(temp_dir_handle.cleanup)
 
     if answer is None:
-        answer = await generate_response(question, file_info)
+        answer = await generate_response(CLIENT, question, file_info, cache_key)
 
     return JSONResponse(content={"answer": answer})
 
 if __name__ == "__main__":
-    # Run the FastAPI app with uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8087)  # Change port as needed
\ No newline at end of file
+    # Run the FastAPI app with uvicorn, one worker per CPU by default; uvicorn's "auto" loop and http
+    # settings pick uvloop and httptools when installed (via uvicorn[standard], where the platform supports them)
+    limit_concurrency = os.getenv('LIMIT_CONCURRENCY')
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8087,  # Change port as needed
+        workers=int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)),
+        limit_concurrency=int(limit_concurrency) if limit_concurrency else None
+    )
\ No newline at end of file